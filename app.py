@@ -1,26 +1,38 @@
 # app.py
 import os
-import json
+import hmac
+import time
+import secrets
 import logging
-import base64
-from datetime import datetime
+import hashlib
+from datetime import datetime, timezone, timedelta
 from types import SimpleNamespace
-from functools import wraps
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from flask import (
     Flask, render_template, request, redirect, url_for, flash,
-    session, send_file, abort, get_flashed_messages
+    session, send_from_directory, abort, get_flashed_messages, jsonify, g
 )
 
-from weasyprint import HTML  # ✅ WeasyPrint ONLY
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
+from flask_caching import Cache
+import orjson
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore, storage
+from google.api_core.exceptions import NotFound, PreconditionFailed
 
 import dotenv
 import config
+import pdf_worker
+from batch_writer import BatchWriter
+from firebase_setup import init_firebase
 
 # --------------------------------------------------
 # ENV + LOGGING
@@ -32,14 +44,56 @@ logger = logging.getLogger(__name__)
 # --------------------------------------------------
 # FLASK APP
 # --------------------------------------------------
+class OrjsonProvider(DefaultJSONProvider):
+    # C-backed encoder/decoder for jsonify and request.get_json
+    def dumps(self, obj, **kwargs):
+        # datetimes are passed through to Flask's default() so they keep its
+        # HTTP-date format instead of orjson's ISO strings
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(
+            obj, default=kwargs.get("default", self.default), option=option
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config.from_object(config)
 app.secret_key = app.config.get(
     "SECRET_KEY",
     os.environ.get("FLASK_SECRET", "dev-secret")
 )
-app.config["TEMPLATES_AUTO_RELOAD"] = True
-app.jinja_env.auto_reload = True
+# FLASK_DEBUG is picked up by Flask() itself; `python app.py` (the Run.bat
+# dev entry) only turns debug on in app.run(), after the templates below
+# are compiled, so settle it here
+if __name__ == "__main__":
+    app.debug = True
+# stat()-ing templates on every render is only useful while developing
+app.config["TEMPLATES_AUTO_RELOAD"] = app.debug
+app.jinja_env.auto_reload = app.debug
+# compiled templates are pickled to disk and reused by fresh workers
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["JINJA_CACHE_DIR"])
+
+def precompiled(name):
+    # compiled once so hot routes skip the loader lookup; debug keeps the
+    # name so auto_reload still picks up template edits
+    return name if app.debug else app.jinja_env.get_template(name)
+
+LETTER_TPL = precompiled("internship_letter.html")
+ADMIN_TPL = precompiled("admin.html")
+VIEW_TPL = precompiled("view_request.html")
+
+# on disk so every gunicorn worker on the host sees the same entries and
+# an invalidation in one worker (reject, approve) reaches all of them
+cache = Cache(app, config={
+    "CACHE_TYPE": "FileSystemCache",
+    "CACHE_DIR": app.config["CACHE_DIR"],
+})
 
 # --------------------------------------------------
 # FOLDERS
@@ -50,42 +104,113 @@ GENERATED_FOLDER = app.config.get("GENERATED_FOLDER", "generated_letters")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, "permission_letters"), exist_ok=True)
+JOURNAL_FOLDER = app.config.get("JOURNAL_FOLDER", "submit_journal")
+os.makedirs(JOURNAL_FOLDER, exist_ok=True)
 
-# --------------------------------------------------
-# FIREBASE INIT (RAILWAY + LOCAL SAFE)
-# --------------------------------------------------
-firebase_cred = os.environ.get("FIREBASE_CREDENTIALS")
-if not firebase_cred:
-    raise RuntimeError("FIREBASE_CREDENTIALS env var not set")
+UPLOAD_DIR = Path(UPLOAD_FOLDER)
+GENERATED_DIR = Path(GENERATED_FOLDER)
+PERMISSION_DIR = UPLOAD_DIR / "permission_letters"
+
+# nginx "internal" locations aliased to the folders above (see README)
+X_ACCEL_LOCATIONS = {
+    UPLOAD_FOLDER: "/protected/uploads/",
+    GENERATED_FOLDER: "/protected/generated_letters/",
+}
 
-try:
-    # Railway: JSON string
-    cred_dict = json.loads(firebase_cred)
-    cred = credentials.Certificate(cred_dict)
-except json.JSONDecodeError:
-    # Local: file path
-    if not os.path.isfile(firebase_cred):
-        raise RuntimeError("Invalid FIREBASE_CREDENTIALS value")
-    cred = credentials.Certificate(firebase_cred)
+# print-sized logo from scripts/gen_assets.py; a stable file:// URL lets the
+# render process decode it once and reuse it from its image cache
+HEADER_LOGO_URI = (Path(app.static_folder) / "img" / "letter_logo.jpg").as_uri()
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
+# letters render in the background so approve returns immediately
+PDF_EXECUTOR = ThreadPoolExecutor(max_workers=pdf_worker.POOL_SIZE + 1)
 
-db = firestore.client()
+# --------------------------------------------------
+# FIREBASE INIT (RAILWAY + LOCAL SAFE)
+# --------------------------------------------------
+# shared, memoized client from firebase_setup
+get_db = init_firebase
 
 # --------------------------------------------------
 # CONSTANTS
 # --------------------------------------------------
 COLLECTION = "internship_requests"
+DESC = firestore.Query.DESCENDING
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 ALLOWED_EXT = {"pdf"}
+FILE_MAX_AGE = 3600
+SIGNED_URL_TTL = timedelta(minutes=15)
+# a "generating" marker older than this belongs to a render that died
+GENERATING_TIMEOUT = timedelta(minutes=10)
+DOC_CACHE_TTL = 60
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# form fields read by /submit
+REQUIRED_FIELDS = (
+    "full_name", "college_name", "email", "start_date", "end_date", "duration",
+)
+OPTIONAL_FIELDS = ("student_year", "branch", "other_branch")
+
+# only what admin.html renders (plus the sort key)
+DASHBOARD_FIELDS = [
+    "student_name", "college_name", "submission_date",
+    "status", "permission_path", "created_at",
+]
+
+# all preview/open/status need to serve a generated letter
+LETTER_FIELDS = ["status", "generated_letter_filename"]
+
+# view_request.html variable -> Firestore field
+VIEW_FIELDS = {
+    "student_name": "student_name",
+    "email": "email",
+    "college": "college_name",
+    "year": "student_year",
+    "branch": "branch",
+    "start_date": "start_date",
+    "end_date": "end_date",
+    "duration": "duration",
+    "submission": "submission_date",
+    "generated_filename": "generated_letter_filename",
+}
+
+@lru_cache(maxsize=1)
+def requests_col():
+    # built on first use (the client itself is lazy), then reused by every route
+    return get_db().collection(COLLECTION)
+
+def _submit_committed():
+    with app.app_context():
+        cache.delete_memoized(_dashboard_rows)
+
+# /submit journals new applications and they reach Firestore in batches
+SUBMIT_WRITER = BatchWriter(get_db, COLLECTION, JOURNAL_FOLDER,
+                            on_commit=_submit_committed)
+
+@lru_cache(maxsize=1)
+def upload_bucket():
+    # permission letters go to Cloud Storage when a bucket is configured,
+    # so every container sees them; otherwise they stay on local disk
+    name = app.config.get("STORAGE_BUCKET")
+    if not name:
+        return None
+    get_db()  # initializes the firebase_admin app the bucket hangs off
+    return storage.bucket(name)
 
 # --------------------------------------------------
 # HELPERS
 # --------------------------------------------------
+@app.before_request
+def load_admin():
+    # the session is checked once per request; static files skip it so
+    # they don't pick up a Vary: Cookie header
+    if request.endpoint != "static":
+        g.admin = bool(session.get("admin_logged_in"))
+
 def admin_required(f):
     @wraps(f)
     def wrap(*args, **kwargs):
-        if not session.get("admin_logged_in"):
+        if not g.get("admin"):
             return redirect(url_for("admin_login"))
         return f(*args, **kwargs)
     return wrap
@@ -93,12 +218,202 @@ def admin_required(f):
 def to_obj(d):
     return SimpleNamespace(**d)
 
-def image_to_data_uri(path: Path):
-    if not path.is_file():
-        return None
-    data = path.read_bytes()
-    mime = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
-    return f"data:{mime};base64," + base64.b64encode(data).decode()
+@cache.memoize(timeout=15)
+def _dashboard_rows(page_token=None, limit=PAGE_SIZE):
+    # plain dicts so the cached value stays picklable
+    query = requests_col().select(DASHBOARD_FIELDS).order_by(
+        "created_at", direction=DESC
+    ).limit(limit)
+    if page_token:
+        query = query.start_after({"created_at": page_token})
+
+    rows = []
+    for d in query.stream():
+        data = d.to_dict() or {}
+        data["doc_ref_id"] = d.id
+        data["status"] = (data.get("status") or "pending").lower()
+        rows.append(data)
+        if len(rows) >= limit:
+            break
+    return rows
+
+def _request_key(req_id, fields):
+    return f"request:{req_id}:{','.join(fields) if fields else '*'}"
+
+def get_request(req_id, fields=None):
+    # approved requests barely change, so their docs are cached for the
+    # file routes; anything still in flight is always read fresh
+    key = _request_key(req_id, fields)
+    data = cache.get(key)
+    if data is None:
+        doc = requests_col().document(req_id).get(field_paths=fields)
+        if not doc.exists:
+            return None
+        data = doc.to_dict() or {}
+        if (data.get("status") or "").lower() == "approved":
+            cache.set(key, data, timeout=DOC_CACHE_TTL)
+    return data
+
+def forget_request(req_id):
+    cache.delete_many(
+        _request_key(req_id, None), _request_key(req_id, LETTER_FIELDS)
+    )
+
+def wants_json():
+    # fetch()/XHR callers ask for JSON; plain form posts get redirects
+    return request.accept_mimetypes.best == "application/json"
+
+def looks_like_pdf(stream):
+    # peek at the header without consuming the upload
+    head = stream.read(1024)
+    stream.seek(0)
+    return b"%PDF" in head
+
+def save_upload(stream, tmp_path):
+    # hash while copying, then store under the content hash so a student
+    # re-sending the same PDF reuses the file already on disk
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as fp:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                fp.write(chunk)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    file_id = digest.hexdigest()[:16]
+    final_path = tmp_path.with_name(f"{file_id}.pdf")
+    if final_path.exists():
+        tmp_path.unlink()
+    else:
+        os.replace(tmp_path, final_path)
+    return final_path.name, file_id
+
+def store_upload(path, blob_name):
+    bucket = upload_bucket()
+    if bucket is None:
+        return
+    # names are content hashes, so an existing object already has these bytes
+    try:
+        bucket.blob(blob_name).upload_from_filename(
+            str(path), content_type="application/pdf", if_generation_match=0
+        )
+    except PreconditionFailed:
+        pass
+    path.unlink(missing_ok=True)
+
+def send_private(directory, filename, **kwargs):
+    if app.config.get("X_ACCEL_REDIRECT"):
+        return x_accel_file(directory, filename, **kwargs)
+
+    # conditional=True answers If-None-Match / If-Modified-Since with a 304;
+    # these are admin-only files, so keep them out of shared caches
+    resp = send_from_directory(
+        directory, filename, conditional=True, max_age=FILE_MAX_AGE, **kwargs
+    )
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    return resp
+
+def x_accel_file(directory, filename, mimetype=None, as_attachment=False):
+    # auth stays in Flask; nginx streams the bytes with sendfile()
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    resp = app.response_class(mimetype=mimetype or "application/octet-stream")
+    resp.headers["X-Accel-Redirect"] = X_ACCEL_LOCATIONS[directory] + quote(filename)
+    if as_attachment:
+        resp.headers.set(
+            "Content-Disposition", "attachment", filename=os.path.basename(path)
+        )
+    resp.cache_control.private = True
+    resp.cache_control.max_age = FILE_MAX_AGE
+    return resp
+
+def generating_stale(data, now=None):
+    # docs marked before generating_since existed count as stale
+    since = data.get("generating_since")
+    if not since:
+        return True
+    now = now or datetime.now(timezone.utc)
+    return now - datetime.fromisoformat(since) > GENERATING_TIMEOUT
+
+@firestore.transactional
+def _approve_txn(tx, doc_ref, changes, pdf_path):
+    # read + conditional write in one atomic step so two admins can't
+    # both start a render; returns (data, started)
+    snap = doc_ref.get(transaction=tx)
+    if not snap.exists:
+        return None, False
+
+    data = snap.to_dict() or {}
+    status = (data.get("status") or "").lower()
+    # a live render holds the request; a stale marker is taken over
+    if status == "generating" and not generating_stale(data):
+        return data, False
+    # re-clicks are free; only re-render if the PDF went missing from disk
+    if status == "approved" and pdf_path.is_file():
+        return data, False
+
+    tx.update(doc_ref, changes)
+    return data, True
+
+@firestore.transactional
+def _finish_txn(tx, doc_ref, changes, since):
+    # only the render that set this "generating" marker may flip it; an
+    # admin may have rejected the request meanwhile, or a retry taken over
+    # a stale marker. Returns (status seen, applied).
+    snap = doc_ref.get(transaction=tx)
+    if not snap.exists:
+        return None, False
+
+    data = snap.to_dict() or {}
+    status = (data.get("status") or "").lower()
+    if status != "generating" or data.get("generating_since") != since:
+        return status, False
+
+    tx.update(doc_ref, changes)
+    return status, True
+
+def render_and_write_pdf(req_id, html, base_url, pdf_path, since):
+    # runs on PDF_EXECUTOR; flips "generating" to "approved" when done.
+    # Nothing reads this job's future, so every failure is logged here.
+    doc_ref = requests_col().document(req_id)
+    with app.app_context():
+        try:
+            # ✅ WeasyPrint ONLY (in the pdf_worker process)
+            pdf_worker.render(html, base_url, pdf_path)
+            rendered = True
+        except Exception:
+            logger.exception("Letter generation failed for %s", req_id)
+            rendered = False
+
+        try:
+            if rendered:
+                status, applied = _finish_txn(
+                    get_db().transaction(), doc_ref, {"status": "approved"}, since
+                )
+                # a newer render of the same request writes this same file
+                if not applied and status not in ("generating", "approved"):
+                    logger.info("Request %s is %s, discarding its letter", req_id, status)
+                    pdf_path.unlink(missing_ok=True)
+            else:
+                _finish_txn(get_db().transaction(), doc_ref, {
+                    "status": "pending",
+                    "generated_letter_filename": None,
+                }, since)
+        except Exception:
+            # the "generating" marker stays until GENERATING_TIMEOUT, after
+            # which approve can take it over
+            logger.exception("Could not record letter result for %s", req_id)
+        finally:
+            forget_request(req_id)
+            cache.delete_memoized(_dashboard_rows)
 
 # --------------------------------------------------
 # PUBLIC ROUTE
@@ -117,10 +432,16 @@ def index():
 @app.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     if request.method == "POST":
-        if (
-            request.form.get("username") == app.config.get("ADMIN_USERNAME")
-            and request.form.get("password") == app.config.get("ADMIN_PASSWORD")
-        ):
+        # compare_digest needs bytes for non-ASCII input; both checks always run
+        user_ok = hmac.compare_digest(
+            request.form.get("username", "").encode(),
+            (app.config.get("ADMIN_USERNAME") or "").encode(),
+        )
+        pass_ok = hmac.compare_digest(
+            request.form.get("password", "").encode(),
+            (app.config.get("ADMIN_PASSWORD") or "").encode(),
+        )
+        if user_ok and pass_ok:
             session["admin_logged_in"] = True
             flash("Logged in successfully.", "login")
             return redirect(url_for("admin_dashboard"))
@@ -139,18 +460,21 @@ def admin_logout():
 @app.route("/admin")
 @admin_required
 def admin_dashboard():
-    docs = db.collection(COLLECTION).order_by(
-        "created_at", direction=firestore.Query.DESCENDING
-    ).stream()
+    page_token = request.args.get("page_token") or None
+    limit = request.args.get("limit", PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = _dashboard_rows(page_token, limit)
 
-    rows = []
-    for d in docs:
-        data = d.to_dict() or {}
-        data["doc_ref_id"] = d.id
-        data["status"] = (data.get("status") or "pending").lower()
-        rows.append(to_obj(data))
+    # a full page means there may be more behind it
+    next_token = rows[-1].get("created_at") if len(rows) == limit else None
 
-    return render_template("admin.html", requests=rows)
+    return render_template(
+        ADMIN_TPL,
+        requests=[to_obj(r) for r in rows],
+        page_token=page_token,
+        next_token=next_token,
+        limit=limit if limit != PAGE_SIZE else None,
+    )
 
 # --------------------------------------------------
 # VIEW REQUEST (FIXED)
@@ -158,32 +482,29 @@ def admin_dashboard():
 @app.route("/admin/view/<req_id>")
 @admin_required
 def admin_view(req_id):
-    doc = db.collection(COLLECTION).document(req_id).get()
-    if not doc.exists:
+    data = get_request(req_id)
+    if data is None:
         abort(404)
-
-    data = doc.to_dict() or {}
     status = (data.get("status") or "pending").lower()
 
     permission = data.get("permission_path")
     if permission:
-        permission = permission.replace("\\", "/")
+        # stored relative to UPLOAD_FOLDER; tolerate a leading "uploads/"
+        permission = permission.replace("\\", "/").removeprefix("uploads/").lstrip("/")
+
+    # written by submit; older docs only carry the path
+    permission_name = data.get("permission_filename")
+    if permission and not permission_name:
+        permission_name = permission.rsplit("/", 1)[-1]
 
     return render_template(
-        "view_request.html",
+        VIEW_TPL,
         req_id=req_id,
-        student_name=data.get("student_name"),
-        email=data.get("email"),
-        college=data.get("college_name"),
-        year=data.get("student_year"),
-        branch=data.get("branch"),
-        start_date=data.get("start_date"),
-        end_date=data.get("end_date"),
-        duration=data.get("duration"),
-        submission=data.get("submission_date"),
         status=status,
-        permission_filename=permission,
-        generated_filename=data.get("generated_letter_filename"),
+        stale=status == "generating" and generating_stale(data),
+        permission_path=permission,
+        permission_filename=permission_name,
+        **{var: data.get(field) for var, field in VIEW_FIELDS.items()},
     )
 
 # --------------------------------------------------
@@ -192,11 +513,9 @@ def admin_view(req_id):
 @app.route("/admin/preview/<req_id>")
 @admin_required
 def preview_letter(req_id):
-    doc = db.collection(COLLECTION).document(req_id).get()
-    if not doc.exists:
+    data = get_request(req_id, LETTER_FIELDS)
+    if data is None:
         abort(404)
-
-    data = doc.to_dict()
     if (data.get("status") or "").lower() != "approved":
         abort(403)
 
@@ -204,11 +523,7 @@ def preview_letter(req_id):
     if not fname:
         abort(404)
 
-    pdf_path = Path(GENERATED_FOLDER) / fname
-    if not pdf_path.is_file():
-        abort(404)
-
-    return send_file(pdf_path, mimetype="application/pdf")
+    return send_private(GENERATED_FOLDER, fname, mimetype="application/pdf")
 
 # --------------------------------------------------
 # APPROVE (WEASYPRINT ONLY)
@@ -216,42 +531,75 @@ def preview_letter(req_id):
 @app.route("/admin/approve/<req_id>", methods=["POST"])
 @admin_required
 def admin_approve(req_id):
-    doc_ref = db.collection(COLLECTION).document(req_id)
-    doc = doc_ref.get()
-    if not doc.exists:
-        abort(404)
+    doc_ref = requests_col().document(req_id)
+    now = datetime.now(timezone.utc)
+    issued = f"{now.day:02d}-{now.month:02d}-{now.year}"
+    pdf_name = f"offer_{req_id}.pdf"
+    pdf_path = GENERATED_DIR / pdf_name
 
-    data = doc.to_dict() or {}
-    issued = datetime.utcnow().strftime("%d-%m-%Y")
+    since = now.isoformat(timespec="microseconds")
+
+    data, started = _approve_txn(get_db().transaction(), doc_ref, {
+        "status": "generating",
+        "generating_since": since,
+        "generated_letter_filename": pdf_name,
+        "issued_date": issued,
+    }, pdf_path)
+    if data is None:
+        abort(404)
+    if not started:
+        if wants_json():
+            return jsonify(status=data.get("status"))
+        if (data.get("status") or "").lower() == "generating":
+            flash("The letter is already being generated.", "info")
+        else:
+            flash("Already approved.", "info")
+        return redirect(url_for("admin_view", req_id=req_id))
+    forget_request(req_id)
+    cache.delete_memoized(_dashboard_rows)
 
-    header_img = image_to_data_uri(
-        Path(app.static_folder) / "img/Fjnpa_logo.png"
-    )
-    
     data.pop("issued_date", None)
+    data.pop("generating_since", None)
 
     html = render_template(
-        "internship_letter.html",
+        LETTER_TPL,
         **data,
         issued_date=issued,
-        header_image=header_img,
-        letter_year=datetime.utcnow().year,
+        header_image=HEADER_LOGO_URI,
+        letter_year=now.year,
     )
 
-    pdf_name = f"offer_{req_id}.pdf"
-    pdf_path = Path(GENERATED_FOLDER) / pdf_name
+    PDF_EXECUTOR.submit(
+        render_and_write_pdf, req_id, html, request.host_url, pdf_path, since
+    )
 
-    # ✅ WeasyPrint ONLY
-    HTML(string=html, base_url=request.host_url).write_pdf(str(pdf_path))
+    if wants_json():
+        return jsonify(
+            status="generating",
+            status_url=url_for("admin_status", req_id=req_id),
+        ), 202
+    flash("Request approved. The letter is being generated.", "success")
+    return redirect(url_for("admin_view", req_id=req_id))
 
-    doc_ref.update({
-        "status": "approved",
-        "generated_letter_filename": pdf_name,
-        "issued_date": issued,
-    })
+# --------------------------------------------------
+# APPROVAL STATUS (polled while a letter renders)
+# --------------------------------------------------
+@app.route("/admin/status/<req_id>")
+@admin_required
+def admin_status(req_id):
+    doc = requests_col().document(req_id).get(
+        field_paths=LETTER_FIELDS + ["generating_since"]
+    )
+    if not doc.exists:
+        abort(404)
 
-    flash("Request approved and letter generated.", "success")
-    return redirect(url_for("admin_view", req_id=req_id))
+    data = doc.to_dict() or {}
+    status = (data.get("status") or "pending").lower()
+    return jsonify(
+        status=status,
+        stale=status == "generating" and generating_stale(data),
+        generated_filename=data.get("generated_letter_filename"),
+    )
 
 # --------------------------------------------------
 # REJECT
@@ -259,10 +607,16 @@ def admin_approve(req_id):
 @app.route("/admin/reject/<req_id>", methods=["POST"])
 @admin_required
 def admin_reject(req_id):
-    db.collection(COLLECTION).document(req_id).update({
-        "status": "rejected",
-        "generated_letter_filename": None
-    })
+    # update() fails on a missing doc, so no separate existence read
+    try:
+        requests_col().document(req_id).update({
+            "status": "rejected",
+            "generated_letter_filename": None
+        })
+    except NotFound:
+        abort(404)
+    forget_request(req_id)
+    cache.delete_memoized(_dashboard_rows)
     flash("Request rejected.", "info")
     return redirect(url_for("admin_view", req_id=req_id))
 
@@ -272,18 +626,24 @@ def admin_reject(req_id):
 @app.route("/uploads/<path:filename>")
 @admin_required
 def uploaded_file(filename):
-    path = Path(UPLOAD_FOLDER) / filename
-    if not path.is_file():
+    # safe_join / send_from_directory reject paths escaping UPLOAD_FOLDER
+    local = safe_join(UPLOAD_FOLDER, filename)
+    if local is None:
         abort(404)
-    return send_file(path)
+    bucket = upload_bucket()
+    if bucket is not None and not os.path.isfile(local):
+        # short-lived signed URL: the browser fetches the PDF from storage
+        return redirect(bucket.blob(filename).generate_signed_url(
+            expiration=SIGNED_URL_TTL, version="v4"
+        ))
+    return send_private(UPLOAD_FOLDER, filename, mimetype="application/pdf")
 
 @app.route("/download_letter/<req_id>")
 @admin_required
 def download_letter(req_id):
-    pdf_path = Path(GENERATED_FOLDER) / f"offer_{req_id}.pdf"
-    if not pdf_path.is_file():
-        abort(404)
-    return send_file(pdf_path, as_attachment=True)
+    return send_private(
+        GENERATED_FOLDER, secure_filename(f"offer_{req_id}.pdf"), as_attachment=True
+    )
 
 # --------------------------------------------------
 # HEALTH CHECK (IMPORTANT FOR RAILWAY)
@@ -297,11 +657,9 @@ def health():
 @app.route("/admin/open-letter/<req_id>")
 @admin_required
 def open_letter(req_id):
-    doc = db.collection(COLLECTION).document(req_id).get()
-    if not doc.exists:
+    data = get_request(req_id, LETTER_FIELDS)
+    if data is None:
         abort(404)
-
-    data = doc.to_dict() or {}
     if (data.get("status") or "").lower() != "approved":
         abort(403)
 
@@ -309,15 +667,7 @@ def open_letter(req_id):
     if not fname:
         abort(404)
 
-    pdf_path = Path(GENERATED_FOLDER) / fname
-    if not pdf_path.is_file():
-        abort(404)
-
-    return send_file(pdf_path, mimetype="application/pdf")
-
-# --------------------------------------------------
-if __name__ == "__main__":
-    app.run(debug=True)
+    return send_private(GENERATED_FOLDER, fname, mimetype="application/pdf")
 
 
 # --------------------------------------------------
@@ -326,22 +676,19 @@ if __name__ == "__main__":
 @app.route('/submit', methods=['POST'])
 def submit():
     try:
-        name = request.form.get('full_name', '').strip()
-        college = request.form.get('college_name', '').strip()
-        email = request.form.get('email', '').strip()
-        start_date = request.form.get('start_date', '').strip()
-        end_date = request.form.get('end_date', '').strip()
-        duration = request.form.get('duration', '').strip()
-        student_year = request.form.get('student_year', '').strip()
-        branch = request.form.get('branch', '').strip()
-        other_branch = request.form.get('other_branch', '').strip()
+        now = datetime.now(timezone.utc)
+        vals = {
+            k: request.form.get(k, '').strip()
+            for k in REQUIRED_FIELDS + OPTIONAL_FIELDS
+        }
 
         submission_date = request.form.get('submission_date')
         if not submission_date:
-            submission_date = datetime.utcnow().strftime('%Y-%m-%d')
+            submission_date = now.date().isoformat()
 
         # basic validation
-        if not (name and college and email and start_date and end_date and duration):
+        missing = [k for k in REQUIRED_FIELDS if not vals[k]]
+        if missing:
             flash("All fields are required.", "danger")
             return redirect(url_for('index'))
 
@@ -355,43 +702,59 @@ def submit():
             flash("Only PDF files are allowed.", "danger")
             return redirect(url_for('index'))
 
-        # save file
-        filename = secure_filename(file.filename)
-        ts = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
-        saved_filename = f"{ts}_{filename}"
+        if not looks_like_pdf(file.stream):
+            flash("The uploaded file is not a valid PDF.", "danger")
+            return redirect(url_for('index'))
 
-        save_path = Path(UPLOAD_FOLDER) / "permission_letters" / saved_filename
-        file.save(save_path)
+        # save file; it ends up named by content hash, so the client's
+        # filename is never part of a path
+        tmp_path = PERMISSION_DIR / f"{time.time_ns()}_{secrets.token_hex(4)}.part"
+        saved_filename, permission_hash = save_upload(file.stream, tmp_path)
+        permission_path = f"permission_letters/{saved_filename}"
+        store_upload(PERMISSION_DIR / saved_filename, permission_path)
 
         # final branch
+        branch, other_branch = vals['branch'], vals['other_branch']
         if branch == "Other" and other_branch:
             branch_final = f"Other ({other_branch})"
         else:
             branch_final = branch or other_branch or ""
 
-        # save to Firestore
-        doc_ref = db.collection(COLLECTION).document()
-        doc_ref.set({
+        # journaled, then written to Firestore by SUBMIT_WRITER
+        doc_ref = requests_col().document()
+        SUBMIT_WRITER.submit(doc_ref.id, {
             "doc_id": doc_ref.id,
-            "student_name": name,
-            "college_name": college,
-            "email": email,
-            "start_date": start_date,
-            "end_date": end_date,
-            "duration": duration,
-            "student_year": student_year,
+            "student_name": vals['full_name'],
+            "college_name": vals['college_name'],
+            "email": vals['email'],
+            "start_date": vals['start_date'],
+            "end_date": vals['end_date'],
+            "duration": vals['duration'],
+            "student_year": vals['student_year'],
             "branch": branch_final,
-            "permission_path": f"permission_letters/{saved_filename}",
+            "permission_path": permission_path,
+            # what the student uploaded, for display; the file is stored by hash
+            "permission_filename": secure_filename(file.filename) or saved_filename,
+            "permission_hash": permission_hash,
             "status": "pending",
             "submission_date": submission_date,
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": now.isoformat(timespec="microseconds")
         })
 
         flash("Application submitted successfully.", "success")
         return redirect(url_for('index'))
 
+    except RequestEntityTooLarge:
+        # MAX_CONTENT_LENGTH tripped while parsing the form; not a server error
+        limit_mb = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+        flash(f"Permission letter PDF must be under {limit_mb} MB.", "danger")
+        return redirect(url_for('index'))
+
     except Exception as e:
         logger.exception("Submit error")
         flash(f"Error submitting application: {str(e)}", "danger")
         return redirect(url_for('index'))
 
+# --------------------------------------------------
+if __name__ == "__main__":
+    app.run(debug=True)
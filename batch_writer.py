@@ -0,0 +1,209 @@
+# batch_writer.py
+# Buffers Firestore document writes and commits them in batches on a
+# background thread, so /submit can answer without waiting on the RPC.
+#
+# Every payload is journaled to disk before it is queued and the journal
+# entry is removed only after its batch commits. Entries left behind by a
+# crash or by a batch that ran out of retries are picked up again by the
+# periodic journal scan. Entries can outlive a commit that did land (a
+# worker dying before it removes the file, or a slow commit another worker
+# replays), so documents are written with create(): a replay finding the
+# document already there counts as committed and never overwrites an
+# approval or rejection made since.
+import os
+import time
+import queue
+import logging
+import threading
+
+import orjson
+from google.api_core.exceptions import AlreadyExists
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 450          # stays under Firestore's 500 writes per commit
+FLUSH_INTERVAL = 0.5     # seconds to wait for more writes to join a batch
+COMMIT_RETRIES = 5
+MAX_BACKOFF = 10
+REPLAY_AGE = 30          # only replay entries no live writer is still holding
+REPLAY_INTERVAL = 10     # seconds between journal scans
+
+
+class BatchWriter:
+    def __init__(self, get_db, collection, journal_dir, on_commit=None):
+        self._get_db = get_db
+        self._collection = collection
+        self._journal_dir = journal_dir
+        self._on_commit = on_commit
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        # doc ids queued in this process and not yet committed / given up on
+        self._inflight = set()
+        self._done = threading.Condition()
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    def submit(self, doc_id, payload):
+        path = os.path.join(self._journal_dir, f"{doc_id}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fp:
+            fp.write(orjson.dumps(payload))
+        os.replace(tmp, path)
+
+        self.start()
+        with self._done:
+            self._inflight.add(doc_id)
+        self._queue.put((doc_id, payload, path))
+
+    def start(self):
+        # one flusher thread per process; a forked worker starts its own
+        with self._lock:
+            if (
+                self._thread is not None
+                and self._pid == os.getpid()
+                and self._thread.is_alive()
+            ):
+                return
+            if self._pid != os.getpid():
+                # anything inherited over fork belongs to the parent
+                self._queue = queue.Queue()
+                self._inflight = set()
+                self._done = threading.Condition()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="firestore-batch-writer", daemon=True
+            )
+            self._thread.start()
+        self._replay()
+
+    def flush(self, timeout=10):
+        # waits until everything queued so far has been committed (or given
+        # up on and left in the journal); True if nothing is left pending
+        deadline = time.monotonic() + timeout
+        with self._done:
+            while self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._done.wait(remaining)
+            return not self._inflight
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _replay(self):
+        cutoff = time.time() - REPLAY_AGE
+        for name in os.listdir(self._journal_dir):
+            # "<id>.json", or "<id>.json.<pid>" claimed by a writer that died
+            doc_id, sep, _ = name.partition(".json")
+            if not sep or name.endswith(".tmp"):
+                continue
+            path = os.path.join(self._journal_dir, name)
+            with self._done:
+                if doc_id in self._inflight:
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    # claim it so concurrent workers don't all replay the same entry
+                    claimed = os.path.join(
+                        self._journal_dir, f"{doc_id}.json.{os.getpid()}"
+                    )
+                    os.rename(path, claimed)
+                    os.utime(claimed)
+                    with open(claimed, "rb") as fp:
+                        payload = orjson.loads(fp.read())
+                except (FileNotFoundError, orjson.JSONDecodeError):
+                    continue
+                self._inflight.add(doc_id)
+            logger.info("Replaying journaled write %s", doc_id)
+            self._queue.put((doc_id, payload, claimed))
+
+    def _run(self):
+        next_scan = time.monotonic() + REPLAY_INTERVAL
+        while True:
+            if time.monotonic() >= next_scan:
+                # retry entries from failed batches and dead workers
+                try:
+                    self._replay()
+                except Exception:
+                    logger.exception("Journal scan failed")
+                next_scan = time.monotonic() + REPLAY_INTERVAL
+            try:
+                items = [self._queue.get(timeout=next_scan - time.monotonic())]
+            except (queue.Empty, ValueError):
+                continue
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(items) < MAX_BATCH:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._commit(items)
+
+    def _touch(self, items):
+        # tells other processes' scans this entry is still being worked on
+        for _, _, path in items:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+    def _create_each(self, col, items):
+        for doc_id, payload, _ in items:
+            try:
+                col.document(doc_id).create(payload)
+            except AlreadyExists:
+                logger.info("Journaled write %s was already committed", doc_id)
+
+    def _commit(self, items):
+        committed = False
+        try:
+            db = self._get_db()
+            col = db.collection(self._collection)
+            for attempt in range(COMMIT_RETRIES):
+                self._touch(items)
+                try:
+                    try:
+                        batch = db.batch()
+                        for doc_id, payload, _ in items:
+                            batch.create(col.document(doc_id), payload)
+                        batch.commit()
+                    except AlreadyExists:
+                        # some of these were written before; the batch is all
+                        # or nothing, so create the rest one by one
+                        self._create_each(col, items)
+                    committed = True
+                    break
+                except Exception:
+                    logger.exception(
+                        "Batch commit failed (attempt %d/%d)",
+                        attempt + 1, COMMIT_RETRIES,
+                    )
+                    if attempt + 1 < COMMIT_RETRIES:
+                        time.sleep(min(2 ** attempt, MAX_BACKOFF))
+
+            if committed:
+                for _, _, path in items:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            # otherwise the journal entries stay on disk and the next scan
+            # past REPLAY_AGE queues them again
+        finally:
+            with self._done:
+                self._inflight.difference_update(doc_id for doc_id, _, _ in items)
+                self._done.notify_all()
+
+        if committed and self._on_commit:
+            try:
+                self._on_commit()
+            except Exception:
+                logger.exception("on_commit callback failed")
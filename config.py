@@ -9,4 +9,23 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads', 'permission_letters')
 GENERATED_FOLDER = os.path.join(BASE_DIR, 'generated_letters')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
+# pending /submit writes, replayed after a crash
+JOURNAL_FOLDER = os.path.join(BASE_DIR, 'submit_journal')
+os.makedirs(JOURNAL_FOLDER, exist_ok=True)
+# Jinja bytecode cache, shared by every worker on the host. Jinja runs the
+# code it finds there, so it lives in the app's own tree, not a guessable
+# shared temp path another user could create first.
+JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'jinja'))
+os.makedirs(JINJA_CACHE_DIR, mode=0o700, exist_ok=True)
+# Cloud Storage bucket for permission letters; empty keeps them on local disk
+STORAGE_BUCKET = os.getenv('FIREBASE_STORAGE_BUCKET','')
+# Flask-Caching store shared by all workers (dashboard pages, approved docs).
+# Entries are pickled and hold applicant details, so it is kept private too.
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'flask'))
+os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # caps permission letter uploads
+# set when running behind nginx with the /protected/ locations from README
+X_ACCEL_REDIRECT = os.getenv('X_ACCEL_REDIRECT','').lower() in ('1','true','yes')
+# Apache mod_xsendfile / lighttpd: Flask sends only an X-Sendfile header
+USE_X_SENDFILE = os.getenv('USE_X_SENDFILE','').lower() in ('1','true','yes')
 WKHTMLTOPDF_PATH = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
@@ -0,0 +1,49 @@
+# firebase_setup.py
+import os
+import threading
+
+import orjson
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+_client = None
+_lock = threading.Lock()
+
+WARM_UP_TIMEOUT = 5  # seconds; best effort, real requests retry normally
+
+
+def _load_credentials():
+    firebase_cred = os.environ.get("FIREBASE_CREDENTIALS")
+    if not firebase_cred:
+        raise RuntimeError("FIREBASE_CREDENTIALS env var not set")
+
+    try:
+        # Railway: JSON string
+        return credentials.Certificate(orjson.loads(firebase_cred))
+    except orjson.JSONDecodeError:
+        # Local: file path
+        if not os.path.isfile(firebase_cred):
+            raise RuntimeError("Invalid FIREBASE_CREDENTIALS value")
+        return credentials.Certificate(firebase_cred)
+
+
+def init_firebase() -> firestore.Client:
+    # the one place credentials are parsed; every caller shares this client
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app(_load_credentials())
+                _client = firestore.client()
+    return _client
+
+
+def warm_up(collection):
+    # opens the gRPC channel and completes the TLS / auth handshake up front,
+    # so the first real request in a worker doesn't pay for it
+    db = init_firebase()
+    db.collection(collection).select([]).limit(1).get(
+        timeout=WARM_UP_TIMEOUT, retry=None
+    )
@@ -0,0 +1,56 @@
+# gunicorn_conf.py
+# gunicorn -c gunicorn_conf.py app:app
+import os
+import threading
+
+# Requests mostly wait on Firestore RPCs, so each worker runs a few
+# threads. gevent is not used: grpc needs its own gevent integration and
+# the letter renderer runs in a spawned process pool.
+#
+# A container's CPU quota doesn't show up in cpu_count() or the affinity
+# mask, which usually report the host, so the default is capped low; set
+# WEB_CONCURRENCY to size it for the actual container.
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", min(_cpus * 2 + 1, 3)))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Import app.py once in the master; workers fork from it and share the
+# loaded code / templates / credentials copy-on-write.
+preload_app = True
+
+
+def when_ready(server):
+    # parse the service account and build the Firestore client once in the
+    # master. Its gRPC channel is opened lazily, so nothing fork-unsafe
+    # exists yet when the workers are forked.
+    from firebase_setup import init_firebase
+    init_firebase()
+
+
+def post_fork(server, worker):
+    # each worker reuses the master's client and opens its own channel
+    # early. That runs on a thread: post_fork happens before the worker
+    # starts heartbeating, so waiting on a slow Firestore here would get the
+    # worker killed by the arbiter's timeout.
+    from app import COLLECTION, SUBMIT_WRITER
+    from firebase_setup import warm_up
+
+    def _warm():
+        try:
+            warm_up(COLLECTION)
+        except Exception:
+            server.log.exception("Firestore warm-up failed")
+
+    threading.Thread(target=_warm, name="firestore-warm-up", daemon=True).start()
+    # flusher thread for /submit; also replays journal entries left by a
+    # worker that died before its batch committed
+    SUBMIT_WRITER.start()
+
+
+def worker_exit(server, worker):
+    # let queued /submit writes reach Firestore before the worker goes;
+    # anything still pending stays journaled for the other workers
+    from app import SUBMIT_WRITER
+    if not SUBMIT_WRITER.flush(timeout=10):
+        server.log.warning("Submit writes still pending at exit; left in journal")
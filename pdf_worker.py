@@ -0,0 +1,109 @@
+# pdf_worker.py
+# Long-lived WeasyPrint process for internship letters.
+#
+# WeasyPrint is imported and warmed up once in a child process instead of
+# inside the Flask workers, so approvals don't pay the import / font setup
+# cost and the render's memory spike stays out of the web process.
+import os
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+LETTER_CSS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "static", "css", "letter.css"
+)
+
+# render processes per web worker; each holds its own WeasyPrint + fonts
+POOL_SIZE = int(os.environ.get("PDF_WORKERS", 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# --------------------------------------------------
+# CHILD PROCESS STATE
+# --------------------------------------------------
+_font_config = None
+_stylesheets = None
+# decoded images, shared by every render in this process; each letter
+# carries the same header logo
+_image_cache = {}
+
+
+def _init_worker():
+    global _font_config, _stylesheets
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    # letter.css (and its @font-face) is parsed once, not per approval
+    _font_config = FontConfiguration()
+    _stylesheets = [CSS(filename=LETTER_CSS_PATH, font_config=_font_config)]
+
+    # throwaway render so fontconfig / Pango caches are hot for the first job
+    HTML(string="<p>warm-up</p>").write_pdf(
+        stylesheets=_stylesheets, font_config=_font_config
+    )
+
+
+def _render(html, base_url, out_path):
+    from weasyprint import HTML
+
+    pdf = HTML(string=html, base_url=base_url).write_pdf(
+        stylesheets=_stylesheets,
+        font_config=_font_config,
+        cache=_image_cache,
+        optimize_images=True,
+    )
+    _write_file(out_path, pdf)
+
+
+def _write_file(path, data):
+    # written next to the target and renamed, so a preview never sees a
+    # half-written letter
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if hasattr(os, "posix_fadvise"):
+            # letters are rarely read back, so keep them from crowding the
+            # page cache; dirty pages can't be dropped until they're synced
+            os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp)
+        raise
+    os.close(fd)
+    os.replace(tmp, path)
+
+# --------------------------------------------------
+# PARENT SIDE
+# --------------------------------------------------
+def get_pool():
+    # created lazily so a pre-forking server never inherits the pool
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def render(html, base_url, out_path):
+    # blocks until the PDF is written; call it from a background thread
+    global _pool
+    try:
+        return get_pool().submit(_render, html, base_url, str(out_path)).result()
+    except BrokenProcessPool:
+        logger.exception("PDF worker died, restarting it on the next job")
+        with _pool_lock:
+            _pool = None
+        raise
@@ -0,0 +1,44 @@
+# scripts/gen_assets.py
+# Prepares static images that get embedded into generated PDFs.
+#
+# Images are scaled down to the size they print at (letter.css) and
+# flattened to JPEG, so WeasyPrint decodes a few KB per render instead of
+# the full-resolution PNG. The letter references the output by file://
+# URL, which WeasyPrint's image cache keys on across renders.
+#
+#   python scripts/gen_assets.py
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+IMG_DIR = ROOT / "static" / "img"
+
+# output -> (source image, height in px); .lh-logo img is 55px, ~180px at 300 DPI
+ASSETS = {
+    "letter_logo.jpg": ("Fjnpa_logo.png", 180),
+}
+JPEG_QUALITY = 85
+
+
+def print_jpeg(src: Path, dest: Path, height: int):
+    img = Image.open(src)
+    img.thumbnail((img.width * height // img.height, height), Image.LANCZOS)
+    if img.mode in ("RGBA", "LA", "P"):
+        # letters are printed on white, so flatten transparency onto it
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, "white")
+        flat.paste(img, mask=img.getchannel("A"))
+        img = flat
+    img.convert("RGB").save(dest, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+
+def main():
+    for out, (src, height) in ASSETS.items():
+        dest = IMG_DIR / out
+        print_jpeg(IMG_DIR / src, dest, height)
+        print(f"wrote {dest.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
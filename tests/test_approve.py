@@ -0,0 +1,188 @@
+# tests/test_approve.py
+# python -m unittest discover -s tests -t .
+import tempfile
+import unittest
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from unittest import mock
+
+import app
+
+
+class FakeSnap:
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDoc:
+    # a single Firestore document; transactions read and update it in place
+    def __init__(self, data):
+        self.data = data
+
+    def get(self, transaction=None, field_paths=None):
+        return FakeSnap(self.data)
+
+
+class FakeTx:
+    def update(self, ref, changes):
+        ref.data.update(changes)
+
+
+class FakeDB:
+    def __init__(self, doc):
+        self.doc = doc
+
+    def transaction(self):
+        return FakeTx()
+
+    def document(self, req_id):
+        return self.doc
+
+
+# the @firestore.transactional wrappers need a real Transaction; the
+# functions they wrap are what holds the state machine
+approve_txn = app._approve_txn.to_wrap
+finish_txn = app._finish_txn.to_wrap
+
+
+def iso(delta=timedelta()):
+    return (datetime.now(timezone.utc) + delta).isoformat(timespec="microseconds")
+
+
+class ApproveTxnTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_path = Path(self.tmp.name) / "offer_r1.pdf"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def approve(self, doc):
+        return approve_txn(FakeTx(), doc, {
+            "status": "generating", "generating_since": iso(),
+        }, self.pdf_path)
+
+    def test_pending_starts_render(self):
+        doc = FakeDoc({"status": "pending"})
+        _, started = self.approve(doc)
+        self.assertTrue(started)
+        self.assertEqual(doc.data["status"], "generating")
+
+    def test_live_marker_is_honoured(self):
+        since = iso(-timedelta(minutes=1))
+        doc = FakeDoc({"status": "generating", "generating_since": since})
+        data, started = self.approve(doc)
+        self.assertFalse(started)
+        self.assertEqual(data["status"], "generating")
+        self.assertEqual(doc.data["generating_since"], since)
+
+    def test_stale_marker_is_taken_over(self):
+        since = iso(-app.GENERATING_TIMEOUT - timedelta(minutes=1))
+        doc = FakeDoc({"status": "generating", "generating_since": since})
+        _, started = self.approve(doc)
+        self.assertTrue(started)
+        self.assertNotEqual(doc.data["generating_since"], since)
+
+    def test_marker_without_timestamp_is_stale(self):
+        doc = FakeDoc({"status": "generating"})
+        _, started = self.approve(doc)
+        self.assertTrue(started)
+
+    def test_approved_with_letter_is_not_rerendered(self):
+        self.pdf_path.write_bytes(b"%PDF-1.4")
+        doc = FakeDoc({"status": "approved"})
+        _, started = self.approve(doc)
+        self.assertFalse(started)
+
+    def test_missing_doc(self):
+        data, started = self.approve(FakeDoc(None))
+        self.assertIsNone(data)
+        self.assertFalse(started)
+
+
+class RenderAndWritePdfTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_path = Path(self.tmp.name) / "offer_r1.pdf"
+        self.since = iso()
+        self.doc = FakeDoc({
+            "status": "generating",
+            "generating_since": self.since,
+            "generated_letter_filename": "offer_r1.pdf",
+        })
+        db = FakeDB(self.doc)
+        for target, value in {
+            "get_db": lambda: db,
+            "requests_col": lambda: db,
+            "_finish_txn": finish_txn,
+        }.items():
+            patcher = mock.patch.object(app, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, since=None, on_render=None, fail=False):
+        def fake_render(html, base_url, out_path):
+            if on_render:
+                on_render()
+            if fail:
+                raise RuntimeError("render failed")
+            Path(out_path).write_bytes(b"%PDF-1.4")
+
+        with mock.patch.object(app.pdf_worker, "render", fake_render):
+            app.render_and_write_pdf(
+                "r1", "<p>letter</p>", "http://x/", self.pdf_path,
+                since or self.since,
+            )
+
+    def test_success_approves(self):
+        self.render()
+        self.assertEqual(self.doc.data["status"], "approved")
+        self.assertTrue(self.pdf_path.exists())
+
+    def test_reject_during_render_keeps_status_and_drops_file(self):
+        def reject():
+            self.doc.data.update(status="rejected", generated_letter_filename=None)
+
+        self.render(on_render=reject)
+        self.assertEqual(self.doc.data["status"], "rejected")
+        self.assertFalse(self.pdf_path.exists())
+
+    def test_render_failure_goes_back_to_pending(self):
+        with self.assertLogs(app.logger, "ERROR"):
+            self.render(fail=True)
+        self.assertEqual(self.doc.data["status"], "pending")
+        self.assertIsNone(self.doc.data["generated_letter_filename"])
+
+    def test_late_render_does_not_flip_newer_marker(self):
+        # a retry took over the stale marker; the old render finishes late
+        newer = iso(timedelta(seconds=1))
+        self.doc.data["generating_since"] = newer
+
+        self.render(since=self.since)
+        self.assertEqual(self.doc.data["status"], "generating")
+        self.assertEqual(self.doc.data["generating_since"], newer)
+        # same file the newer render writes, so it is left in place
+        self.assertTrue(self.pdf_path.exists())
+
+    def test_finish_error_is_logged(self):
+        def broken(*args, **kwargs):
+            raise RuntimeError("transaction aborted")
+
+        with mock.patch.object(app, "_finish_txn", broken):
+            with self.assertLogs(app.logger, "ERROR") as logs:
+                self.render()
+        self.assertIn("Could not record letter result", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
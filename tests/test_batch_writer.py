@@ -0,0 +1,199 @@
+# tests/test_batch_writer.py
+# python -m unittest discover -s tests -t .
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+import orjson
+from google.api_core.exceptions import AlreadyExists
+
+import batch_writer
+from batch_writer import BatchWriter
+
+
+class FakeDB:
+    # just enough of firestore.Client for BatchWriter: collection().document()
+    # with create(), and batch().create()/commit(); commit fails while
+    # `failures` > 0
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.docs = {}
+        self.commits = 0
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        db = self
+
+        class Ref:
+            id = doc_id
+
+            def create(self, payload):
+                if doc_id in db.docs:
+                    raise AlreadyExists(doc_id)
+                db.docs[doc_id] = payload
+
+        return Ref()
+
+    def batch(self):
+        db = self
+        writes = {}
+
+        class Batch:
+            def create(self, ref, payload):
+                writes[ref.id] = payload
+
+            def commit(self):
+                if db.failures:
+                    db.failures -= 1
+                    raise RuntimeError("unavailable")
+                # all or nothing, like Firestore
+                for doc_id in writes:
+                    if doc_id in db.docs:
+                        raise AlreadyExists(doc_id)
+                db.docs.update(writes)
+                db.commits += 1
+
+        return Batch()
+
+
+class BatchWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.db = FakeDB()
+        self.committed = []
+        self.writer = BatchWriter(
+            lambda: self.db, "requests", self.dir,
+            on_commit=lambda: self.committed.append(True),
+        )
+        for name, value in {
+            "FLUSH_INTERVAL": 0.05,
+            "COMMIT_RETRIES": 2,
+            "MAX_BACKOFF": 0,
+            "REPLAY_INTERVAL": 0.1,
+        }.items():
+            patcher = mock.patch.object(batch_writer, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def journal(self):
+        return sorted(os.listdir(self.dir))
+
+    def write_entry(self, name, payload, age=0):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as fp:
+            fp.write(orjson.dumps(payload))
+        if age:
+            then = time.time() - age
+            os.utime(path, (then, then))
+        return path
+
+    def test_submit_commits_and_clears_journal(self):
+        self.writer.submit("a", {"n": 1})
+        self.writer.submit("b", {"n": 2})
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        self.assertEqual(self.db.docs, {"a": {"n": 1}, "b": {"n": 2}})
+        self.assertEqual(self.journal(), [])
+        self.assertTrue(self.committed)
+
+    def test_failed_batch_stays_journaled(self):
+        self.db.failures = batch_writer.COMMIT_RETRIES
+        path = self.write_entry("a.json", {"n": 1})
+
+        self.writer._commit([("a", {"n": 1}, path)])
+
+        self.assertEqual(self.db.docs, {})
+        self.assertEqual(self.journal(), ["a.json"])
+        self.assertEqual(self.committed, [])
+        # given up on, so flush() doesn't wait on it and a scan may retry it
+        self.assertTrue(self.writer.flush(timeout=0))
+
+    def test_retry_within_batch(self):
+        self.db.failures = 1
+        path = self.write_entry("a.json", {"n": 1})
+
+        self.writer._commit([("a", {"n": 1}, path)])
+
+        self.assertEqual(self.db.docs, {"a": {"n": 1}})
+        self.assertEqual(self.journal(), [])
+
+    def test_live_process_retries_failed_batch(self):
+        # every attempt of the first batch fails; the periodic scan in the
+        # flusher thread must pick the entry up again without a restart
+        self.db.failures = batch_writer.COMMIT_RETRIES
+        with mock.patch.object(batch_writer, "REPLAY_AGE", 0):
+            self.writer.submit("a", {"n": 1})
+            deadline = time.monotonic() + 5
+            while "a" not in self.db.docs and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        self.assertEqual(self.db.docs, {"a": {"n": 1}})
+        self.assertEqual(self.journal(), [])
+
+    def test_replay_recent_crash_entry_on_later_scan(self):
+        # a worker respawned right after a crash sees a fresh entry; it is
+        # skipped at start but replayed once it passes REPLAY_AGE
+        path = self.write_entry("a.json", {"n": 1})
+        with mock.patch.object(batch_writer, "REPLAY_AGE", 30):
+            self.writer.start()
+            time.sleep(0.3)
+            self.assertEqual(self.db.docs, {})
+
+        then = time.time() - 60
+        os.utime(path, (then, then))
+        deadline = time.monotonic() + 5
+        while "a" not in self.db.docs and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(self.db.docs, {"a": {"n": 1}})
+        self.assertEqual(self.journal(), [])
+
+    def test_replay_claims_orphaned_entries(self):
+        self.write_entry("a.json", {"n": 1}, age=60)
+        # claimed by a replaying worker that then died
+        self.write_entry("b.json.99999", {"n": 2}, age=60)
+        self.write_entry("c.json.tmp", {"n": 3}, age=60)
+
+        self.writer.start()
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        self.assertEqual(self.db.docs, {"a": {"n": 1}, "b": {"n": 2}})
+        self.assertEqual(self.journal(), ["c.json.tmp"])
+
+    def test_replay_does_not_overwrite_committed_doc(self):
+        # the worker died between commit() and removing the journal file,
+        # and an admin has approved the request since
+        self.db.docs["a"] = {"status": "approved"}
+        self.write_entry("a.json", {"status": "pending"}, age=60)
+        self.write_entry("b.json", {"status": "pending"}, age=60)
+
+        self.writer.start()
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        self.assertEqual(self.db.docs, {
+            "a": {"status": "approved"},
+            "b": {"status": "pending"},
+        })
+        self.assertEqual(self.journal(), [])
+
+    def test_replay_skips_inflight_entries(self):
+        path = self.write_entry("a.json", {"n": 1}, age=60)
+        self.writer._inflight.add("a")
+
+        with mock.patch.object(batch_writer, "REPLAY_AGE", 0):
+            self.writer._replay()
+
+        self.assertTrue(self.writer._queue.empty())
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()